@@ -1,16 +1,74 @@
 """Generate Allure report Github Action."""
 
+import fcntl
+import os
 import re
 import shutil
 import subprocess
+import tempfile
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
 from functools import cached_property
 from pathlib import Path
 
 from github_custom_actions import ActionBase, ActionInputs, ActionOutputs
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import BaseLoader, ChoiceLoader, Environment, FileSystemLoader, ModuleLoader
 
 from __about__ import __version__
 
+REPORT_ARCHIVE_MODES = ("", "zip", "zip-only")
+# Already compressed formats gain nothing from deflate, so they are stored as is
+ARCHIVE_STORED_SUFFIXES = frozenset(
+    {".png", ".jpg", ".jpeg", ".gif", ".webp", ".ico", ".woff", ".woff2", ".zip", ".gz", ".mp4"},
+)
+LOCK_POLL_INTERVAL = 0.5  # seconds
+
+TEMPLATES_DIR = Path(__file__).resolve().parent / "templates"
+# Set in the Docker image where `compile_templates()` runs on build, so templates are not parsed
+# on each run. Never set it for development: compiled templates would hide template changes.
+COMPILED_TEMPLATES_ENV = "ALLURE_REPORT_COMPILED_TEMPLATES"
+
+
+def template_loader() -> BaseLoader:
+    """Loader of the action templates, precompiled ones are preferred if configured."""
+    loader = FileSystemLoader(str(TEMPLATES_DIR))
+    compiled_dir = os.environ.get(COMPILED_TEMPLATES_ENV)
+    if compiled_dir and Path(compiled_dir).is_dir():
+        return ChoiceLoader([ModuleLoader(compiled_dir), loader])
+    return loader
+
+
+def compile_templates(target: Path) -> None:
+    """Compile the action templates to Python modules in `target`."""
+    Environment(loader=FileSystemLoader(str(TEMPLATES_DIR))).compile_templates(
+        target,
+        zip=None,
+        ignore_errors=False,
+    )
+
+
+def write_text_atomic(path: Path, text: str) -> None:
+    """Write the file so that readers never see it half-written."""
+    temp_path = path.with_name(f".{path.name}.tmp")
+    temp_path.write_text(text)
+    temp_path.replace(path)
+
+
+def replace_dir(source: Path, target: Path) -> None:
+    """Move `source` folder to `target` replacing the old one.
+
+    Rename is atomic so `target` is never seen partially written.
+    """
+    if target.exists():
+        trash = target.with_name(f".{target.name}.old")
+        shutil.rmtree(trash, ignore_errors=True)
+        target.rename(trash)
+        source.rename(target)
+        shutil.rmtree(trash)
+    else:
+        source.rename(target)
+
 
 class AllureGeneratorInputs(ActionInputs):  # type: ignore  # pylint: disable=too-few-public-methods
     """Action inputs."""
@@ -47,6 +105,12 @@ class AllureGeneratorInputs(ActionInputs):  # type: ignore  # pylint: disable=to
     summary: str
     """Summary of the action."""
 
+    report_archive: str
+    """Pack the report into a single zip: empty to disable, `zip` or `zip-only`."""
+
+    lock_timeout: str
+    """Seconds to wait for other jobs updating the same reports site."""
+
 
 class AllureGeneratorOutputs(ActionOutputs):  # type: ignore  # pylint: disable=too-few-public-methods
     """Action outputs."""
@@ -55,6 +119,7 @@ class AllureGeneratorOutputs(ActionOutputs):  # type: ignore  # pylint: disable=
     reports_root_url: str
     reports_site_path: str
     reports_site: Path
+    report_archive_file: Path
 
 
 class AllureGenerator(ActionBase):  # type: ignore  # pylint: disable=too-many-instance-attributes
@@ -87,20 +152,49 @@ class AllureGenerator(ActionBase):  # type: ignore  # pylint: disable=too-many-i
         if self.max_history_reports < 0:
             raise ValueError("max-reports cannot be negative.")
 
-        base_dir = Path(__file__).resolve().parent
-        templates_dir = base_dir / "templates"
-        self.environment = Environment(loader=FileSystemLoader(str(templates_dir)))
+        self.report_archive = (self.inputs.report_archive or "").strip().lower()
+        if self.report_archive not in REPORT_ARCHIVE_MODES:
+            raise ValueError(
+                f"report-archive must be one of {', '.join(REPORT_ARCHIVE_MODES[1:])} or empty.",
+            )
+
+        self.lock_timeout = float(self.inputs.lock_timeout or 0)
+        if self.lock_timeout < 0:
+            raise ValueError("lock-timeout cannot be negative.")
+
+        self.environment = Environment(loader=template_loader())
+
+        # Temporary folder with the report and its history before they are published to the site,
+        # created by `generate_allure_report()`. Located in the reports site so they could be
+        # renamed into place, dot-prefixed so it is not mistaken for a report by `cleanup_reports`.
+        self.build_dir: Path | None = None
 
     def main(self) -> None:
         """Generate Allure report."""
         # 1st copy old reports to result directory to make it safe to republish
         if self.prev_reports != self.reports_site:
-            shutil.copytree(self.prev_reports, self.reports_site, dirs_exist_ok=True)
+            with self.site_lock():
+                shutil.copytree(
+                    self.prev_reports,
+                    self.reports_site,
+                    ignore=self.keep_site_state,
+                    dirs_exist_ok=True,
+                )
         if not any(self.inputs.allure_results.iterdir()):
             raise ValueError(f"No Allure results found in `{self.inputs.allure_results}`.")
-        self.generate_allure_report()
-        self.cleanup_reports()
-        self.create_index_html()
+        # The lock is held from reading `last-history` until the new history is published,
+        # otherwise a concurrent job would drop this run from the history
+        with self.site_lock():
+            try:
+                self.generate_allure_report()
+                if self.report_archive:
+                    self.outputs.report_archive_file = self.archive_report()
+                self.publish_report()
+                self.cleanup_reports()
+                self.create_index_html()
+            finally:
+                if self.build_dir is not None:
+                    shutil.rmtree(self.build_dir, ignore_errors=True)
         self.outputs.report_url = f"{self.last_report_file_url}{self.report_page()}"
         self.outputs.reports_root_url = self.root_url
         self.outputs.reports_site_path = self.inputs.reports_site_path
@@ -112,7 +206,17 @@ class AllureGenerator(ActionBase):  # type: ignore  # pylint: disable=too-many-i
         """Cleanup old reports if max history reports is set.
 
         In site report folder each report is stored in a separate sub folder.
+        Also removes build folders left by killed jobs.
+        Must be called under `site_lock()`.
         """
+        for folder in self.reports_site.glob(".*"):
+            if (
+                folder.is_dir()
+                and re.match(r"^\.\d+-\d+-", folder.name)
+                and folder != self.build_dir
+            ):
+                print(f"Removing stale build folder {folder.name} ...")
+                shutil.rmtree(folder, ignore_errors=True)
         reports_folders = [
             f
             for f in self.reports_site.glob("*")
@@ -134,8 +238,49 @@ class AllureGenerator(ActionBase):  # type: ignore  # pylint: disable=too-many-i
             for report in reports_folders[:excess_count]:
                 print(f"Removing {report.name} ...")
                 shutil.rmtree(report)
+                (self.reports_site / f"{report.name}.zip").unlink(missing_ok=True)
         print("Cleanup done.")
 
+    def keep_site_state(self, folder: str, names: list[str]) -> list[str]:
+        """`copytree` ignore callback to not overwrite the site state with an old checkout.
+
+        Other jobs sharing the site could have published newer `last-history` and `index.html`.
+        """
+        if Path(folder) != self.prev_reports:
+            return []
+        return [
+            name
+            for name in ("last-history", "index.html")
+            if name in names and (self.reports_site / name).exists()
+        ]
+
+    @contextmanager
+    def site_lock(self) -> Iterator[None]:
+        """Serialize updates of the reports site between jobs sharing it.
+
+        The lock is held on the reports site folder itself so no lock file is published.
+        """
+        deadline = time.monotonic() + self.lock_timeout
+        fd = os.open(self.reports_site, os.O_RDONLY)
+        try:
+            waiting = False
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        raise TimeoutError(
+                            f"Cannot lock `{self.reports_site}` in {self.lock_timeout} seconds.",
+                        ) from None
+                    if not waiting:
+                        print(f"Waiting for other jobs to release `{self.reports_site}` ...")
+                        waiting = True
+                    time.sleep(LOCK_POLL_INTERVAL)
+            yield
+        finally:
+            os.close(fd)  # releases the lock
+
     @cached_property
     def root_url(self) -> str:
         """Get URL to the root of reports."""
@@ -166,10 +311,13 @@ class AllureGenerator(ActionBase):  # type: ignore  # pylint: disable=too-many-i
         """Create index.html in the report folder root with redirect to the last report."""
         template = self.environment.get_template("index.html")
         rendered_template = template.render(url=f"{self.last_report_file_url}{self.report_page()}")
-        (self.reports_site / "index.html").write_text(rendered_template)
+        write_text_atomic(self.reports_site / "index.html", rendered_template)
 
     def generate_allure_report(self) -> None:
-        """Prepare params and Call allure generate."""
+        """Prepare params and Call allure generate.
+
+        Must be called under `site_lock()` held until `publish_report()`.
+        """
         template = self.environment.get_template("executor.json")
         # https://allurereport.org/docs/how-it-works-executor-file/
         rendered_template = template.render(
@@ -185,14 +333,19 @@ class AllureGenerator(ActionBase):  # type: ignore  # pylint: disable=too-many-i
 
         # https://allurereport.org/docs/how-it-works-history-files/
         # Copy last report history to the allure results so that it is included in the new report
-        (self.prev_reports / "last-history").mkdir(parents=True, exist_ok=True)
+        # Read from the site, not `prev_reports`: other jobs sharing the site publish there
+        (self.reports_site / "last-history").mkdir(parents=True, exist_ok=True)
         shutil.copytree(
-            self.prev_reports / "last-history",
+            self.reports_site / "last-history",
             self.inputs.allure_results / "history",
             dirs_exist_ok=True,
         )
 
-        print(f"Generating report from {self.inputs.allure_results} to {self.reports_site} ...")
+        self.build_dir = Path(
+            tempfile.mkdtemp(prefix=f".{self.run_folder_name}-", dir=self.reports_site),
+        )
+        report_dir = self.build_dir / "report"
+        print(f"Generating report from {self.inputs.allure_results} to {report_dir} ...")
         subprocess.run(
             [
                 "allure",
@@ -200,18 +353,72 @@ class AllureGenerator(ActionBase):  # type: ignore  # pylint: disable=too-many-i
                 "--clean",
                 str(self.inputs.allure_results),
                 "-o",
-                str(self.reports_site / self.run_folder_name),
+                str(report_dir),
             ],
             check=True,
         )
-
-        shutil.copytree(
-            self.reports_site / self.run_folder_name / "history",
-            self.reports_site / "last-history",
-            dirs_exist_ok=True,
-        )
+        # Keep the history aside as in `zip-only` mode the report folder is replaced with a loader
+        shutil.copytree(report_dir / "history", self.build_dir / "history")
         print("Report generated.")
 
+    def publish_report(self) -> None:
+        """Move the generated report and its archive into place, replace `last-history`.
+
+        Must be called under `site_lock()`.
+        """
+        report_dir = self.reports_site / self.run_folder_name
+        print(f"Publishing report to {report_dir} ...")
+        replace_dir(self.build_dir / "report", report_dir)
+        archive = self.build_dir / f"{self.run_folder_name}.zip"
+        if archive.exists():
+            archive.replace(self.reports_site / archive.name)
+        replace_dir(self.build_dir / "history", self.reports_site / "last-history")
+        print("Report published.")
+
+    def archive_report(self) -> Path:
+        """Pack the report folder into a single zip archive to be published next to it.
+
+        Entries in already compressed formats are stored, the rest are deflated.
+        In `zip-only` mode the report folder is replaced with a service worker loader
+        that serves the report straight from the archive.
+        """
+        import zipfile  # only needed for archives, keep it out of the cold start
+
+        report_dir = self.build_dir / "report"
+        archive = self.reports_site / f"{self.run_folder_name}.zip"
+        print(f"Packing report to {archive} ...")
+        try:
+            # The `zip-only` loader does not read Zip64 archives
+            with zipfile.ZipFile(
+                self.build_dir / archive.name,
+                "w",
+                allowZip64=self.report_archive != "zip-only",
+            ) as zip_file:
+                for file in sorted(path for path in report_dir.rglob("*") if path.is_file()):
+                    compress_type = (
+                        zipfile.ZIP_STORED
+                        if file.suffix.lower() in ARCHIVE_STORED_SUFFIXES
+                        else zipfile.ZIP_DEFLATED
+                    )
+                    zip_file.write(
+                        file,
+                        file.relative_to(report_dir).as_posix(),
+                        compress_type=compress_type,
+                    )
+        except zipfile.LargeZipFile as e:
+            raise ValueError(
+                f"The report is too large for `report-archive: zip-only` ({e}), use `zip`.",
+            ) from e
+
+        if self.report_archive == "zip-only":
+            shutil.rmtree(report_dir)
+            report_dir.mkdir()
+            for file_name in ("index.html", "sw.js"):
+                template = self.environment.get_template(f"archive-{file_name}")
+                (report_dir / file_name).write_text(template.render(archive=archive.name))
+        print("Report packed.")
+        return archive
+
 
 if __name__ == "__main__":  # pragma: no cover
     AllureGenerator().run()
@@ -0,0 +1,119 @@
+// Serves the Allure report straight from the zip archive next to the report folder.
+const scope = self.registration.scope;
+const archiveUrl = new URL("../{{ archive }}", scope).href;
+const contentTypes = {
+    css: "text/css",
+    csv: "text/csv",
+    gif: "image/gif",
+    html: "text/html",
+    ico: "image/x-icon",
+    jpeg: "image/jpeg",
+    jpg: "image/jpeg",
+    js: "text/javascript",
+    json: "application/json",
+    png: "image/png",
+    svg: "image/svg+xml",
+    txt: "text/plain",
+    webp: "image/webp",
+    woff: "font/woff",
+    woff2: "font/woff2",
+};
+let archive;
+
+async function fetchRange(range) {
+    const response = await fetch(archiveUrl, { headers: { Range: `bytes=${range}` } });
+    if (!response.ok) throw new Error(`Cannot load ${archiveUrl}: ${response.status}`);
+    return { partial: response.status === 206, buffer: await response.arrayBuffer() };
+}
+
+function readDirectory(view, offset, count) {
+    const decoder = new TextDecoder();
+    const index = new Map();
+    for (; count > 0; count--) {
+        const nameLength = view.getUint16(offset + 28, true);
+        const name = new Uint8Array(view.buffer, view.byteOffset + offset + 46, nameLength);
+        index.set(decoder.decode(name), {
+            method: view.getUint16(offset + 10, true),
+            size: view.getUint32(offset + 20, true),
+            local: view.getUint32(offset + 42, true),
+        });
+        offset += 46 + nameLength + view.getUint16(offset + 30, true) + view.getUint16(offset + 32, true);
+    }
+    return index;
+}
+
+function dataOffset(header, local) {
+    // `header` is the entry local file header
+    return local + 30 + header.getUint16(26, true) + header.getUint16(28, true);
+}
+
+async function openArchive() {
+    // The end of central directory record (22 bytes and up to 64 KiB comment) closes the archive.
+    // Zip64 is not supported, the action does not create Zip64 archives in `zip-only` mode.
+    const tail = await fetchRange(`-${22 + 0xffff}`);
+    const view = new DataView(tail.buffer);
+    let end = view.byteLength - 22;
+    while (end >= 0 && view.getUint32(end, true) !== 0x06054b50) end--;
+    if (end < 0) throw new Error(`${archiveUrl} is not a zip archive`);
+    const count = view.getUint16(end + 10, true);
+    const size = view.getUint32(end + 12, true);
+    const offset = view.getUint32(end + 16, true);
+
+    if (!tail.partial) {
+        // The server ignores Range so the whole archive is downloaded
+        return {
+            index: readDirectory(view, offset, count),
+            read: async (entry) => {
+                const start = dataOffset(new DataView(tail.buffer, entry.local), entry.local);
+                return new Uint8Array(tail.buffer, start, entry.size);
+            },
+        };
+    }
+    // The central directory is right before its end record, usually within the fetched tail
+    const directory =
+        end >= size
+            ? new DataView(tail.buffer, end - size, size)
+            : new DataView((await fetchRange(`${offset}-${offset + size - 1}`)).buffer);
+    return {
+        index: readDirectory(directory, 0, count),
+        read: async (entry) => {
+            const header = await fetchRange(`${entry.local}-${entry.local + 29}`);
+            const start = dataOffset(new DataView(header.buffer), entry.local);
+            if (entry.size === 0) return new Uint8Array(0);
+            return new Uint8Array((await fetchRange(`${start}-${start + entry.size - 1}`)).buffer);
+        },
+    };
+}
+
+function loadArchive() {
+    // Only the central directory is kept, entries are fetched on demand with Range requests
+    archive ??= openArchive().catch((error) => {
+        archive = undefined;
+        throw error;
+    });
+    return archive;
+}
+
+function respond(name, entry, data) {
+    let body = new Blob([data]).stream();
+    if (entry.method === 8) body = body.pipeThrough(new DecompressionStream("deflate-raw"));
+    const type = contentTypes[name.split(".").pop().toLowerCase()] || "application/octet-stream";
+    return new Response(body, { headers: { "Content-Type": type } });
+}
+
+async function serve(request, name) {
+    const { index, read } = await loadArchive();
+    const entry = index.get(name);
+    if (!entry) return fetch(request);
+    return respond(name, entry, await read(entry));
+}
+
+self.addEventListener("install", () => self.skipWaiting());
+self.addEventListener("activate", (event) => event.waitUntil(self.clients.claim()));
+self.addEventListener("fetch", (event) => {
+    const url = new URL(event.request.url);
+    if (event.request.method !== "GET" || !url.href.startsWith(scope)) return;
+    let name = decodeURIComponent(url.pathname.slice(new URL(scope).pathname.length));
+    if (name === "" || name.endsWith("/")) name += "index.html";
+    event.respondWith(serve(event.request, name));
+});
@@ -66,6 +66,8 @@ def env():
             "INPUT_MAX-REPORTS": "20",
             "INPUT_CI-NAME": "GitHub Action: {{env.github_workflow}}",
             "INPUT_REPORT-NAME": "Allure Report",
+            "INPUT_REPORT-ARCHIVE": "",
+            "INPUT_LOCK-TIMEOUT": "600",
             "INPUT_SUMMARY": "\n  ## Allure test report\n[Allure test report]({{ outputs['report-url'] }})\n\n",
         }
         github_output_path = pathlib.Path(env_vars["GITHUB_OUTPUT"])
@@ -74,3 +76,14 @@ def env():
 
         with patch.dict(os.environ, env_vars):
             yield
+
+
+@pytest.fixture
+def fake_allure():
+    """Mock `allure generate` creating a report with history in the output folder."""
+
+    def generate(command, check):
+        (pathlib.Path(command[-1]) / "history").mkdir(parents=True, exist_ok=True)
+
+    with patch("subprocess.run", side_effect=generate) as mock_run:
+        yield mock_run
@@ -1,4 +1,10 @@
+import fcntl
+import json
 import os
+import subprocess
+import threading
+import time
+import zipfile
 from unittest.mock import MagicMock, patch, PropertyMock
 import pytest
 from pathlib import Path
@@ -100,31 +106,25 @@ def test_inplace_reports(env):
         assert (gen.reports_site / "22" / "index.html").exists()
 
 
-def test_website_folder_unexisted(env):
+def test_website_folder_unexisted(env, fake_allure):
     with patch.dict(os.environ, {"INPUT_WEBSITE": "-unexisted-"}):
-        with patch("subprocess.run"):
-            gen = AllureGenerator()
-            (gen.reports_site / gen.run_folder_name / "history").mkdir(parents=True, exist_ok=True)
-            gen.run()
+        gen = AllureGenerator()
+        gen.run()
         assert not (gen.reports_site / "22").exists()
         assert (gen.reports_site / "index.html").exists()
         assert not (gen.reports_site / "22").exists()
 
 
-def test_no_summary(env):
+def test_no_summary(env, fake_allure):
     with patch.dict(os.environ, {"INPUT_SUMMARY": ""}):
-        with patch("subprocess.run"):
-            gen = AllureGenerator()
-            (gen.reports_site / gen.run_folder_name / "history").mkdir(parents=True, exist_ok=True)
-            gen.run()
+        gen = AllureGenerator()
+        gen.run()
         assert gen.env.github_step_summary.read_text() == ""
 
 
-def test_summary(env):
-    with patch("subprocess.run"):
-        gen = AllureGenerator()
-        (gen.reports_site / gen.run_folder_name / "history").mkdir(parents=True, exist_ok=True)
-        gen.run()
+def test_summary(env, fake_allure):
+    gen = AllureGenerator()
+    gen.run()
     assert "github.io" in gen.outputs["report-url"]
     assert gen.outputs["report-url"] in gen.env.github_output.read_text()
     assert "reports-site-path=builds/tests" in gen.env.github_output.read_text()
@@ -158,3 +158,194 @@ def test_cleanup_mixed_old_and_new_folders(env):
         ]
         assert len(deleted) == 1
         assert deleted[0].name == "5"
+
+
+def _fake_report(command, check):
+    report_dir = Path(command[-1])
+    (report_dir / "history").mkdir(parents=True, exist_ok=True)
+    (report_dir / "data" / "attachments").mkdir(parents=True, exist_ok=True)
+    (report_dir / "index.html").write_text("<html>report</html>")
+    (report_dir / "data" / "attachments" / "screen.png").write_bytes(b"\x89PNG")
+
+
+def _run_with_fake_report(gen):
+    with patch("subprocess.run", side_effect=_fake_report):
+        gen.run()
+    return gen.reports_site / gen.run_folder_name
+
+
+def test_report_archive_zip(env):
+    with patch.dict(os.environ, {"INPUT_REPORT-ARCHIVE": "zip"}):
+        gen = AllureGenerator()
+        report_dir = _run_with_fake_report(gen)
+    archive = gen.reports_site / f"{gen.run_folder_name}.zip"
+    assert f"report-archive-file={archive}" in gen.env.github_output.read_text()
+    with zipfile.ZipFile(archive) as zip_file:
+        assert zip_file.read("index.html") == b"<html>report</html>"
+        assert zip_file.getinfo("index.html").compress_type == zipfile.ZIP_DEFLATED
+        assert zip_file.getinfo("data/attachments/screen.png").compress_type == zipfile.ZIP_STORED
+    assert (report_dir / "data" / "attachments" / "screen.png").exists()
+
+
+def test_report_archive_zip_only(env):
+    with patch.dict(os.environ, {"INPUT_REPORT-ARCHIVE": "zip-only"}):
+        gen = AllureGenerator()
+        report_dir = _run_with_fake_report(gen)
+    assert sorted(f.name for f in report_dir.iterdir()) == ["index.html", "sw.js"]
+    assert "sw.js" in (report_dir / "index.html").read_text()
+    assert f'"../{gen.run_folder_name}.zip"' in (report_dir / "sw.js").read_text()
+    assert (gen.reports_site / "last-history").exists()
+
+
+def test_report_archive_invalid(env):
+    with patch.dict(os.environ, {"INPUT_REPORT-ARCHIVE": "tar"}):
+        with pytest.raises(ValueError, match="report-archive must be one of"):
+            AllureGenerator()
+
+
+def test_cleanup_removes_report_archives(env):
+    gen = AllureGenerator()
+    gen.max_history_reports = 1
+    for name in ["7-1", "8-1"]:
+        (gen.reports_site / name).mkdir(parents=True)
+        (gen.reports_site / f"{name}.zip").write_bytes(b"")
+    gen.cleanup_reports()
+    assert not (gen.reports_site / "7-1.zip").exists()
+    assert (gen.reports_site / "8-1.zip").exists()
+
+
+def test_report_published_atomically(env):
+    gen = AllureGenerator()
+    report_dir = _run_with_fake_report(gen)
+    assert (report_dir / "index.html").read_text() == "<html>report</html>"
+    assert (gen.reports_site / "last-history").is_dir()
+    assert not gen.build_dir.exists()
+    assert not [f for f in gen.reports_site.iterdir() if f.name.startswith(".")]
+
+
+def test_build_dir_removed_on_failure(env):
+    gen = AllureGenerator()
+    with patch("subprocess.run", side_effect=subprocess.CalledProcessError(1, "allure")):
+        with pytest.raises(SystemExit):
+            gen.run()
+    assert gen.build_dir is not None
+    assert not gen.build_dir.exists()
+    assert not (gen.reports_site / gen.run_folder_name).exists()
+
+
+def test_no_build_dir_on_early_failure(env):
+    gen = AllureGenerator()
+    with patch.object(AllureGenerator, "generate_allure_report", side_effect=OSError("no allure")):
+        with pytest.raises(SystemExit):
+            gen.run()
+    assert gen.build_dir is None
+    assert not [f for f in gen.reports_site.iterdir() if f.name.startswith(".")]
+
+
+def test_site_lock_timeout(env):
+    gen = AllureGenerator()
+    gen.lock_timeout = 0.1
+    fd = os.open(gen.reports_site, os.O_RDONLY)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        with pytest.raises(TimeoutError, match="Cannot lock"):
+            with gen.site_lock():
+                pass
+    finally:
+        os.close(fd)
+    with gen.site_lock():
+        pass
+
+
+def test_invalid_lock_timeout(env):
+    with patch.dict(os.environ, {"INPUT_LOCK-TIMEOUT": "-1"}):
+        with pytest.raises(ValueError, match="lock-timeout cannot be negative."):
+            AllureGenerator()
+
+
+def _fake_allure(generating: threading.Event):
+    """Fake `allure generate` adding its run to the history read from the results."""
+
+    def run(command, check):
+        results, report_dir = Path(command[3]), Path(command[5])
+        history_file = results / "history" / "history.json"
+        history = json.loads(history_file.read_text()) if history_file.exists() else {}
+        generating.set()
+        time.sleep(0.5)  # let the other job try to read the history meanwhile
+        (report_dir / "history").mkdir(parents=True)
+        run_name = report_dir.parent.name[1:].rsplit("-", 1)[0]
+        history[run_name] = {"items": []}
+        (report_dir / "history" / "history.json").write_text(json.dumps(history))
+
+    return run
+
+
+def test_concurrent_runs_keep_history(env):
+    first, second = AllureGenerator(), AllureGenerator()
+    second.__dict__["run_folder_name"] = "2-1"
+    first_generating = threading.Event()
+    with patch("subprocess.run", side_effect=_fake_allure(first_generating)):
+        first_job = threading.Thread(target=first.run)
+        first_job.start()
+        assert first_generating.wait(timeout=10)
+        second.run()
+        first_job.join()
+    history = json.loads((second.reports_site / "last-history" / "history.json").read_text())
+    assert {"1-1", "2-1"} <= history.keys()
+    assert (second.reports_site / "1-1").is_dir()
+    assert (second.reports_site / "2-1").is_dir()
+
+
+def test_cleanup_removes_stale_build_dirs(env):
+    gen = AllureGenerator()
+    stale = gen.reports_site / ".7-1-abcd1234"
+    (stale / "report").mkdir(parents=True)
+    gen.build_dir = gen.reports_site / ".1-1-current"
+    gen.build_dir.mkdir()
+    gen.cleanup_reports()
+    assert not stale.exists()
+    assert gen.build_dir.exists()
+
+
+def test_archive_not_published_on_failure(env):
+    with patch.dict(os.environ, {"INPUT_REPORT-ARCHIVE": "zip"}):
+        gen = AllureGenerator()
+    with patch.object(AllureGenerator, "publish_report", side_effect=OSError("disk full")):
+        with pytest.raises(SystemExit):
+            _run_with_fake_report(gen)
+    assert not (gen.reports_site / f"{gen.run_folder_name}.zip").exists()
+    assert not gen.build_dir.exists()
+
+
+def test_site_lock_waiting_reported_once(env, capsys):
+    gen = AllureGenerator()
+    gen.lock_timeout = 1.2
+    fd = os.open(gen.reports_site, os.O_RDONLY)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        with pytest.raises(TimeoutError):
+            with gen.site_lock():
+                pass
+    finally:
+        os.close(fd)
+    assert capsys.readouterr().out.count("Waiting for other jobs") == 1
+
+
+def test_report_archive_zip_only_refuses_zip64(env):
+    with patch.dict(os.environ, {"INPUT_REPORT-ARCHIVE": "zip-only"}):
+        gen = AllureGenerator()
+    gen.build_dir = gen.reports_site / ".1-1-current"
+    (gen.build_dir / "report").mkdir(parents=True)
+    for name in ["index.html", "app.js"]:
+        (gen.build_dir / "report" / name).write_text(name)
+    with patch.object(zipfile, "ZIP_FILECOUNT_LIMIT", 1):
+        with pytest.raises(ValueError, match="too large for `report-archive: zip-only`"):
+            gen.archive_report()
+
+
+def test_report_archive_zip_allows_zip64(env):
+    with patch.dict(os.environ, {"INPUT_REPORT-ARCHIVE": "zip"}):
+        gen = AllureGenerator()
+    with patch.object(zipfile, "ZIP_FILECOUNT_LIMIT", 1):
+        _run_with_fake_report(gen)
+    assert (gen.reports_site / f"{gen.run_folder_name}.zip").exists()
@@ -0,0 +1,120 @@
+"""Action cold start: it is paid on each run of the action."""
+
+import os
+import statistics
+import subprocess
+import sys
+from unittest.mock import patch
+
+import pytest
+from jinja2 import Environment, FileSystemLoader, ModuleLoader
+
+from src import allure_generate
+from src.allure_generate import COMPILED_TEMPLATES_ENV, compile_templates
+from tests.conftest import ROOT_DIR
+
+# Budgets are ratios, so they do not depend on the runner speed, but they are tight and a busy
+# runner fails them, so the timing tests are opt-in with `-m benchmark`.
+# `allure_generate` own import to `github_custom_actions` import (that brings in jinja2), ~0.12
+OWN_IMPORT_BUDGET = 0.14
+# `AllureGenerator()` construction to `github_custom_actions` import, ~0.01
+CONSTRUCT_BUDGET = 0.03
+# Rendering both templates precompiled to rendering them from source, ~0.35
+COMPILED_RENDER_BUDGET = 0.7
+BENCHMARK_RUNS = 9
+DEFERRED_MODULES = ["zipfile"]
+
+BENCHMARK = """
+import time
+start = time.perf_counter()
+import github_custom_actions
+dependencies = time.perf_counter()
+import allure_generate
+imported = time.perf_counter()
+generator = allure_generate.AllureGenerator()
+constructed = time.perf_counter()
+generator.environment.get_template("index.html").render(url="https://example.com")
+generator.environment.get_template("executor.json").render()
+rendered = time.perf_counter()
+print(dependencies - start, imported - dependencies, constructed - imported, rendered - constructed)
+"""
+
+
+def _startup_times(extra_env: dict[str, str]) -> dict[str, float]:
+    """Median seconds of the cold start phases, each run in a fresh interpreter."""
+    runs = []
+    for _ in range(BENCHMARK_RUNS):
+        result = subprocess.run(
+            [sys.executable, "-c", BENCHMARK],
+            env={**os.environ, "PYTHONPATH": f"{ROOT_DIR}/src", **extra_env},
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        runs.append([float(time) for time in result.stdout.splitlines()[-1].split()])
+    phases = ["dependencies", "import", "construct", "render"]
+    return {phase: statistics.median(run[i] for run in runs) for i, phase in enumerate(phases)}
+
+
+def _import_times(module: str) -> dict[str, int]:
+    """Cumulative import time in microseconds per module from a fresh interpreter."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env={**os.environ, "PYTHONPATH": f"{ROOT_DIR}/src"},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line and "cumulative" not in line:
+            _, cumulative, name = line.split("|")
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+@pytest.mark.benchmark
+def test_startup_budget(env):
+    times = _startup_times({COMPILED_TEMPLATES_ENV: ""})
+    assert times["import"] < OWN_IMPORT_BUDGET * times["dependencies"], times
+    assert times["construct"] < CONSTRUCT_BUDGET * times["dependencies"], times
+
+
+@pytest.mark.benchmark
+def test_compiled_templates_start_faster(env, tmp_path):
+    compile_templates(tmp_path)
+    source = _startup_times({COMPILED_TEMPLATES_ENV: ""})
+    compiled = _startup_times({COMPILED_TEMPLATES_ENV: str(tmp_path)})
+    assert compiled["render"] < COMPILED_RENDER_BUDGET * source["render"], (compiled, source)
+
+
+@pytest.mark.parametrize("module", DEFERRED_MODULES)
+def test_deferred_imports(module):
+    assert module not in _import_times("allure_generate")
+
+
+@pytest.mark.parametrize("template_name", ["index.html", "executor.json", "archive-sw.js"])
+def test_compiled_templates(tmp_path, template_name):
+    compile_templates(tmp_path)
+    context = {"url": "https://example.com", "archive": "1-1.zip", "report_name": "Report"}
+    compiled = Environment(loader=ModuleLoader(str(tmp_path))).get_template(template_name)
+    source = Environment(loader=FileSystemLoader(str(allure_generate.TEMPLATES_DIR))).get_template(
+        template_name
+    )
+    assert compiled.render(**context) == source.render(**context)
+
+
+def test_compiled_templates_preferred(env, tmp_path):
+    compile_templates(tmp_path)
+    with patch.dict(os.environ, {COMPILED_TEMPLATES_ENV: str(tmp_path)}):
+        gen = allure_generate.AllureGenerator()
+    assert gen.environment.get_template("index.html").filename.startswith(str(tmp_path))
+
+
+@pytest.mark.parametrize("compiled_dir", ["", "missing"])
+def test_source_templates_without_compiled(env, tmp_path, compiled_dir):
+    compile_templates(tmp_path / "compiled")  # not configured, so must not be used
+    with patch.dict(os.environ, {COMPILED_TEMPLATES_ENV: compiled_dir}):
+        gen = allure_generate.AllureGenerator()
+    template = gen.environment.get_template("index.html")
+    assert template.filename == str(allure_generate.TEMPLATES_DIR / "index.html")